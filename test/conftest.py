@@ -1,3 +1,5 @@
+import asyncio
+
 import pytest
 
 # 使用 pytest 钩子设置 asyncio 默认 fixture 循环作用域
@@ -9,3 +11,13 @@ def pytest_addoption(parser):
         help='default fixture loop scope',
         default='function'
     )
+
+
+@pytest.fixture(scope="session")
+def event_loop_policy():
+    """安装了 uvloop 时，所有异步测试使用 uvloop 事件循环"""
+    try:
+        import uvloop
+    except ImportError:
+        return asyncio.get_event_loop_policy()
+    return uvloop.EventLoopPolicy()
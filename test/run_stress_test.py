@@ -4,6 +4,8 @@ import asyncio
 import logging
 import time
 import sys
+from collections import OrderedDict
+from itertools import islice
 from test_py import SessionClient
 
 # 配置日志
@@ -19,58 +21,51 @@ logger = logging.getLogger("stress_test")
 
 
 async def run_stress_test(client_count: int, sessions_per_client: int,
-                          batch_size: int = 10, sleep_between_batches: float = 0.1):
+                          max_inflight: int = 64):
     """运行内存压力测试"""
-    logger.info(f"开始内存压力测试: {client_count} 客户端, 每客户端 {sessions_per_client} 会话")
+    logger.info(f"开始内存压力测试: {client_count} 客户端, 每客户端 {sessions_per_client} 会话, "
+                f"最大并发请求 {max_inflight}")
 
-    # 创建客户端
-    clients = []
-    for i in range(client_count):
-        client = SessionClient()
-        await client.connect()
-        clients.append(client)
-        logger.info(f"客户端 {i+1}/{client_count} 连接成功")
+    # 创建客户端并并发建立连接
+    clients = [SessionClient() for _ in range(client_count)]
+    await asyncio.gather(*(client.connect() for client in clients))
+    logger.info(f"{client_count} 个客户端连接成功")
 
     try:
-        start_time = time.time()
-        total_sessions = 0
+        start_ns = time.perf_counter_ns()
+        total_sessions = client_count * sessions_per_client
+        done_sessions = 0
+
+        # 用信号量限制同时在途的请求数，代替固定的批次间暂停
+        sem = asyncio.Semaphore(max_inflight)
+
+        async def _go(set_session, uid: int):
+            nonlocal done_sessions
+            async with sem:
+                result = await set_session(uid)
+            done_sessions += 1
+            if done_sessions % max_inflight == 0:
+                logger.info(f"已创建 {done_sessions}/{total_sessions} 会话")
+            return result
+
+        # 预先绑定各客户端的 set_session，避免在循环中重复查找属性
+        setters = [client.set_session for client in clients]
+
+        # 任一任务异常时 TaskGroup 会取消其余任务，便于快速结束
+        async with asyncio.TaskGroup() as tg:
+            create_task = tg.create_task
+            # UID = 10000 * 客户端序号 + 会话序号，确保UID唯一
+            tasks = [create_task(_go(set_session, 10000 * client_idx + session_idx))
+                     for client_idx, set_session in enumerate(setters)
+                     for session_idx in range(sessions_per_client)]
+
+        # 统计成功数
         success_sessions = 0
+        for task in tasks:
+            if task.result()[0] == 0:
+                success_sessions += 1
 
-        # 为每个客户端创建会话
-        for client_idx, client in enumerate(clients):
-            logger.info(f"客户端 {client_idx+1} 开始创建会话")
-            client_success = 0
-
-            # 分批创建会话以减轻服务器压力
-            for batch_start in range(0, sessions_per_client, batch_size):
-                batch_end = min(batch_start + batch_size, sessions_per_client)
-                batch_size_actual = batch_end - batch_start
-
-                tasks = []
-                for i in range(batch_size_actual):
-                    session_idx = batch_start + i
-                    uid = 10000 * client_idx + session_idx  # 确保UID唯一
-                    tasks.append(client.set_session(uid))
-
-                # 执行批量创建
-                results = await asyncio.gather(*tasks, return_exceptions=True)
-
-                # 统计成功数
-                for result in results:
-                    total_sessions += 1
-                    if isinstance(result, tuple) and result[0] == 0:
-                        success_sessions += 1
-                        client_success += 1
-
-                # 记录进度并暂停一下，避免请求过于密集
-                logger.info(
-                    f"客户端 {client_idx+1} - 已创建 {batch_end}/{sessions_per_client} 会话")
-                await asyncio.sleep(sleep_between_batches)
-
-            logger.info(
-                f"客户端 {client_idx+1} 完成 - 成功率: {client_success}/{sessions_per_client}")
-
-        duration = time.time() - start_time
+        duration = (time.perf_counter_ns() - start_ns) * 1e-9
 
         # 输出总体统计
         logger.info("=" * 50)
@@ -85,8 +80,8 @@ async def run_stress_test(client_count: int, sessions_per_client: int,
     finally:
         # 关闭所有客户端连接
         logger.info("关闭客户端连接...")
-        for client in clients:
-            await client.disconnect()
+        await asyncio.gather(*(client.disconnect() for client in clients),
+                             return_exceptions=True)
 
 
 async def memory_leak_test(hours: float = 1.0, check_interval: int = 300):
@@ -99,7 +94,8 @@ async def memory_leak_test(hours: float = 1.0, check_interval: int = 300):
     try:
         end_time = time.time() + hours * 3600
         check_count = 0
-        active_sessions = {}  # 会话ID -> 创建时间
+        # 会话ID -> 创建时间，按插入顺序即创建时间排列
+        active_sessions: "OrderedDict[str, float]" = OrderedDict()
 
         while time.time() < end_time:
             check_count += 1
@@ -108,27 +104,36 @@ async def memory_leak_test(hours: float = 1.0, check_interval: int = 300):
 
             # 创建一些新会话
             new_sessions = 10
-            for i in range(new_sessions):
-                uid = int(time.time() * 1000) % 1000000 + i
-                result = await client.set_session(uid)
-                if result[0] == 0 and result[1]:
+            base_uid = int(time.time() * 1000) % 1000000
+            created = await asyncio.gather(
+                *(client.set_session(base_uid + i) for i in range(new_sessions)),
+                return_exceptions=True)
+            for result in created:
+                if isinstance(result, Exception):
+                    logger.error("创建会话时发生异常: %s", result)
+                elif result[0] == 0 and result[1]:
                     active_sessions[result[1]] = time.time()
 
             # 获取一些现有会话
             if active_sessions:
-                sessions_to_check = min(20, len(active_sessions))
-                session_ids = list(active_sessions.keys())[-sessions_to_check:]
+                session_ids = list(islice(reversed(active_sessions), 20))
 
                 for session_id in session_ids:
                     await client.get_session(session_id)
 
             # 删除一些旧会话
             if len(active_sessions) > 100:  # 保持会话数在100以内
-                sessions_to_delete = sorted(
-                    active_sessions.items(), key=lambda x: x[1])[:20]
-                for session_id, _ in sessions_to_delete:
-                    await client.delete_session(session_id)
-                    active_sessions.pop(session_id, None)
+                to_delete = [active_sessions.popitem(last=False)
+                             for _ in range(20)]
+                deleted = await asyncio.gather(
+                    *(client.delete_session(session_id) for session_id, _ in to_delete),
+                    return_exceptions=True)
+                # 删除失败的会话按原顺序放回队首，下一轮重试，避免泄漏
+                for (session_id, created_at), result in zip(reversed(to_delete), reversed(deleted)):
+                    if result != 0:
+                        logger.warning("删除会话 %s 失败: %s", session_id, result)
+                        active_sessions[session_id] = created_at
+                        active_sessions.move_to_end(session_id, last=False)
 
             logger.info(f"活跃会话数: {len(active_sessions)}")
 
@@ -140,13 +145,22 @@ async def memory_leak_test(hours: float = 1.0, check_interval: int = 300):
     finally:
         # 清理会话和连接
         logger.info("清理所有活跃会话...")
-        for session_id in list(active_sessions.keys()):
-            await client.delete_session(session_id)
+        remaining = list(active_sessions)
+        deleted = await client.delete_sessions(remaining)
+        failed = len(remaining) - deleted.count(0)
+        if failed:
+            logger.warning("有 %s 个会话清理失败", failed)
 
         await client.disconnect()
 
 
 if __name__ == "__main__":
+    try:
+        import uvloop
+        run = uvloop.run
+    except ImportError:  # 未安装 uvloop 时使用默认事件循环
+        run = asyncio.run
+
     parser = argparse.ArgumentParser(description="StealthIM Session 服务压力测试工具")
 
     subparsers = parser.add_subparsers(dest="command", help="子命令")
@@ -157,10 +171,8 @@ if __name__ == "__main__":
                                help="并发客户端数量 (默认: 5)")
     stress_parser.add_argument("-s", "--sessions", type=int, default=100,
                                help="每个客户端创建的会话数 (默认: 100)")
-    stress_parser.add_argument("-b", "--batch", type=int, default=10,
-                               help="批量创建的会话数 (默认: 10)")
-    stress_parser.add_argument("--sleep", type=float, default=0.1,
-                               help="批次间暂停时间(秒) (默认: 0.1)")
+    stress_parser.add_argument("-m", "--inflight", type=int, default=64,
+                               help="最大同时在途请求数 (默认: 64)")
 
     # 内存泄漏测试命令
     leak_parser = subparsers.add_parser("leak", help="内存泄漏测试")
@@ -172,14 +184,13 @@ if __name__ == "__main__":
     args = parser.parse_args()
 
     if args.command == "stress":
-        asyncio.run(run_stress_test(
+        run(run_stress_test(
             client_count=args.clients,
             sessions_per_client=args.sessions,
-            batch_size=args.batch,
-            sleep_between_batches=args.sleep
+            max_inflight=args.inflight
         ))
     elif args.command == "leak":
-        asyncio.run(memory_leak_test(
+        run(memory_leak_test(
             hours=args.hours,
             check_interval=args.interval
         ))
@@ -3,13 +3,20 @@ import asyncio
 import argparse
 import logging
 import time
-import statistics
 import sys
-import json
+import numpy as np
+import orjson
+from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Dict, List, Tuple, Any
 from test_py import SessionClient
 
+try:
+    from numba import njit
+except ImportError:  # 未安装 numba 时退回解释执行
+    def njit(*args, **kwargs):
+        return lambda func: func
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -22,142 +29,201 @@ logging.basicConfig(
 )
 logger = logging.getLogger("diagnostics")
 
-# 诊断结果存储
-results = {
-    "latency": {
-        "set": [],
-        "get": [],
-        "del": [],
-        "ping": []
-    },
-    "errors": {
-        "set": [],
-        "get": [],
-        "del": [],
-        "ping": []
-    },
-    "success_rate": {
-        "set": 0,
-        "get": 0,
-        "del": 0,
-        "ping": 0
-    },
-    "test_conditions": {},
-    "verdict": ""
+OPERATIONS = ("ping", "set", "get", "del")
+
+
+def _empty_latencies() -> np.ndarray:
+    return np.empty(0, dtype=np.float64)
+
+
+@dataclass
+class DiagResults:
+    """单次诊断的结果，每个操作的延迟分别存为连续的 float64 数组"""
+    ping_lat: np.ndarray = field(default_factory=_empty_latencies)
+    set_lat: np.ndarray = field(default_factory=_empty_latencies)
+    get_lat: np.ndarray = field(default_factory=_empty_latencies)
+    del_lat: np.ndarray = field(default_factory=_empty_latencies)
+    ping_err: List[str] = field(default_factory=list)
+    set_err: List[str] = field(default_factory=list)
+    get_err: List[str] = field(default_factory=list)
+    del_err: List[str] = field(default_factory=list)
+    ping_rate: float = 0.0
+    set_rate: float = 0.0
+    get_rate: float = 0.0
+    del_rate: float = 0.0
+    test_conditions: Dict[str, Any] = field(default_factory=dict)
+    verdict: str = ""
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为原有的 JSON 结构，延迟数组由 orjson 直接序列化"""
+        return {
+            "latency": {op: getattr(self, f"{op}_lat") for op in OPERATIONS},
+            "errors": {op: getattr(self, f"{op}_err") for op in OPERATIONS},
+            "success_rate": {op: getattr(self, f"{op}_rate") for op in OPERATIONS},
+            "test_conditions": self.test_conditions,
+            "verdict": self.verdict,
+        }
+
+
+def latency_stats(latencies) -> Tuple[float, float, float]:
+    """计算延迟的平均值、最小值和最大值"""
+    arr = np.asarray(latencies, dtype=np.float64)
+    return float(arr.mean()), float(arr.min()), float(arr.max())
+
+
+@njit(cache=True)
+def _analyze(arr, hi_thresh=0.5):
+    """分析单个操作的延迟样本，返回 (平均值, 标准差, 是否高延迟, 是否波动大)"""
+    n = arr.size
+    s = 0.0
+    for i in range(n):
+        s += arr[i]
+    m = s / n
+    v = 0.0
+    for i in range(n):
+        d = arr[i] - m
+        v += d * d
+    sd = (v / (n - 1)) ** 0.5 if n > 1 else 0.0
+    return m, sd, m > hi_thresh, sd > m * 0.5
+
+
+# 操作名 -> 调用方法，以及对应的成功判定
+_OPS = {
+    "ping": lambda c, *a: c.ping(),
+    "set": lambda c, uid=12345, *a: c.set_session(uid),
+    "get": lambda c, session_id="", *a: c.get_session(session_id),
+    "del": lambda c, session_id="", *a: c.delete_session(session_id),
+}
+
+_SUCCESS = {
+    "ping": lambda r: r is True,
+    "set": lambda r: r[0] == 0,
+    "get": lambda r: r[0] == 0,
+    "del": lambda r: r == 0,
 }
 
 
-async def measure_operation(client: SessionClient, operation: str, *args, **kwargs) -> Tuple[float, Any, bool]:
+async def measure_operation(client: SessionClient, operation: str, *args) -> Tuple[float, Any, bool]:
     """测量操作延迟和结果"""
-    start_time = time.time()
+    start_ns = time.perf_counter_ns()
     success = False
     error_msg = None
 
     try:
-        if operation == "ping":
-            result = await client.ping()
-            success = result is True
-        elif operation == "set":
-            uid = args[0] if args else kwargs.get("uid", 12345)
-            result = await client.set_session(uid)
-            success = result[0] == 0
-        elif operation == "get":
-            session_id = args[0] if args else kwargs.get("session_id", "")
-            result = await client.get_session(session_id)
-            success = result[0] == 0
-        elif operation == "del":
-            session_id = args[0] if args else kwargs.get("session_id", "")
-            result = await client.delete_session(session_id)
-            success = result == 0
-        else:
+        call = _OPS.get(operation)
+        if call is None:
             raise ValueError(f"未知操作: {operation}")
+        result = await call(client, *args)
+        success = _SUCCESS[operation](result)
 
     except Exception as e:
         result = None
         error_msg = str(e)
         logger.error(f"操作 {operation} 出错: {e}")
 
-    latency = time.time() - start_time
+    latency = (time.perf_counter_ns() - start_ns) * 1e-9
 
     return latency, result, success, error_msg
 
 
-async def run_latency_test(client: SessionClient, operation_count: int = 50):
+def _make_measurer(operation: str, call, is_ok):
+    """为固定的调用和成功判定生成专用的测量函数，省去每次调用的分派"""
+    async def _measure(*args) -> Tuple[float, Any, bool, Any]:
+        start_ns = time.perf_counter_ns()
+        try:
+            result = await call(*args)
+        except Exception as e:
+            logger.error(f"操作 {operation} 出错: {e}")
+            return (time.perf_counter_ns() - start_ns) * 1e-9, None, False, str(e)
+        return (time.perf_counter_ns() - start_ns) * 1e-9, result, is_ok(result), None
+
+    return _measure
+
+
+async def run_latency_test(client: SessionClient, results: DiagResults,
+                           operation_count: int = 50, concurrency: int = 10):
     """运行延迟测试"""
-    logger.info(f"开始延迟测试 - 每个操作执行 {operation_count} 次")
+    logger.info(f"开始延迟测试 - 每个操作执行 {operation_count} 次, 并发上限 {concurrency}")
 
-    # 测试 ping 延迟
-    for i in range(operation_count):
-        latency, _, success, error = await measure_operation(client, "ping")
-        results["latency"]["ping"].append(latency)
-        if not success and error:
-            results["errors"]["ping"].append(error)
+    # 限制同时进行的请求数，单次延迟仍在测量函数内独立计时
+    sem = asyncio.Semaphore(concurrency)
+
+    async def _one(measure, *args):
+        async with sem:
+            return await measure(*args)
 
-    ping_success_rate = 1 - (len(results["errors"]["ping"]) / operation_count)
-    results["success_rate"]["ping"] = ping_success_rate
+    ping_m = _make_measurer("ping", client.ping, _SUCCESS["ping"])
+    set_m = _make_measurer("set", client.set_session, _SUCCESS["set"])
+    get_m = _make_measurer("get", client.get_session, _SUCCESS["get"])
+    del_m = _make_measurer("del", client.delete_session, _SUCCESS["del"])
 
-    logger.info(f"Ping 延迟: avg={statistics.mean(results['latency']['ping']):.4f}s, "
-                f"min={min(results['latency']['ping']):.4f}s, "
-                f"max={max(results['latency']['ping']):.4f}s, "
+    # 测试 ping 延迟
+    outs = await asyncio.gather(*(_one(ping_m) for _ in range(operation_count)))
+    results.ping_lat = ping_lat = np.fromiter(
+        (o[0] for o in outs), dtype=np.float64, count=len(outs))
+    results.ping_err = [o[3] for o in outs if not o[2] and o[3]]
+
+    ping_success_rate = 1 - (len(results.ping_err) / operation_count)
+    results.ping_rate = ping_success_rate
+
+    avg, lo, hi = latency_stats(ping_lat)
+    logger.info(f"Ping 延迟: avg={avg:.4f}s, "
+                f"min={lo:.4f}s, "
+                f"max={hi:.4f}s, "
                 f"成功率: {ping_success_rate*100:.1f}%")
 
     # 测试 set 操作延迟和成功率
-    session_ids = []
-    for i in range(operation_count):
-        uid = 10000 + i
-        latency, result, success, error = await measure_operation(client, "set", uid)
-        results["latency"]["set"].append(latency)
-        if success:
-            session_ids.append(result[1])
-        elif error:
-            results["errors"]["set"].append(error)
+    outs = await asyncio.gather(*(_one(set_m, 10000 + i) for i in range(operation_count)))
+    results.set_lat = set_lat = np.fromiter(
+        (o[0] for o in outs), dtype=np.float64, count=len(outs))
+    results.set_err = [o[3] for o in outs if not o[2] and o[3]]
+    session_ids = [o[1][1] for o in outs if o[2]]
 
     set_success_rate = len(session_ids) / operation_count
-    results["success_rate"]["set"] = set_success_rate
+    results.set_rate = set_success_rate
 
-    logger.info(f"Set 延迟: avg={statistics.mean(results['latency']['set']):.4f}s, "
-                f"min={min(results['latency']['set']):.4f}s, "
-                f"max={max(results['latency']['set']):.4f}s, "
+    avg, lo, hi = latency_stats(set_lat)
+    logger.info(f"Set 延迟: avg={avg:.4f}s, "
+                f"min={lo:.4f}s, "
+                f"max={hi:.4f}s, "
                 f"成功率: {set_success_rate*100:.1f}%")
 
+    test_ids = session_ids[:operation_count]
+
     # 测试 get 操作延迟和成功率
-    if session_ids:
-        for session_id in session_ids[:min(operation_count, len(session_ids))]:
-            latency, _, success, error = await measure_operation(client, "get", session_id)
-            results["latency"]["get"].append(latency)
-            if not success and error:
-                results["errors"]["get"].append(error)
+    if test_ids:
+        outs = await asyncio.gather(*(_one(get_m, sid) for sid in test_ids))
+        results.get_lat = get_lat = np.fromiter(
+            (o[0] for o in outs), dtype=np.float64, count=len(outs))
+        results.get_err = [o[3] for o in outs if not o[2] and o[3]]
 
-        get_success_rate = 1 - (len(results["errors"]["get"]) / len(
-            results["latency"]["get"]) if results["latency"]["get"] else 0)
-        results["success_rate"]["get"] = get_success_rate
+        get_success_rate = 1 - len(results.get_err) / get_lat.size
+        results.get_rate = get_success_rate
 
-        if results["latency"]["get"]:
-            logger.info(f"Get 延迟: avg={statistics.mean(results['latency']['get']):.4f}s, "
-                        f"min={min(results['latency']['get']):.4f}s, "
-                        f"max={max(results['latency']['get']):.4f}s, "
-                        f"成功率: {get_success_rate*100:.1f}%")
+        avg, lo, hi = latency_stats(get_lat)
+        logger.info(f"Get 延迟: avg={avg:.4f}s, "
+                    f"min={lo:.4f}s, "
+                    f"max={hi:.4f}s, "
+                    f"成功率: {get_success_rate*100:.1f}%")
 
     # 测试 delete 操作延迟和成功率
-    if session_ids:
-        for session_id in session_ids[:min(operation_count, len(session_ids))]:
-            latency, _, success, error = await measure_operation(client, "del", session_id)
-            results["latency"]["del"].append(latency)
-            if not success and error:
-                results["errors"]["del"].append(error)
+    if test_ids:
+        outs = await asyncio.gather(*(_one(del_m, sid) for sid in test_ids))
+        results.del_lat = del_lat = np.fromiter(
+            (o[0] for o in outs), dtype=np.float64, count=len(outs))
+        results.del_err = [o[3] for o in outs if not o[2] and o[3]]
 
-        del_success_rate = 1 - (len(results["errors"]["del"]) / len(
-            results["latency"]["del"]) if results["latency"]["del"] else 0)
-        results["success_rate"]["del"] = del_success_rate
+        del_success_rate = 1 - len(results.del_err) / del_lat.size
+        results.del_rate = del_success_rate
 
-        if results["latency"]["del"]:
-            logger.info(f"Delete 延迟: avg={statistics.mean(results['latency']['del']):.4f}s, "
-                        f"min={min(results['latency']['del']):.4f}s, "
-                        f"max={max(results['latency']['del']):.4f}s, "
-                        f"成功率: {del_success_rate*100:.1f}%")
+        avg, lo, hi = latency_stats(del_lat)
+        logger.info(f"Delete 延迟: avg={avg:.4f}s, "
+                    f"min={lo:.4f}s, "
+                    f"max={hi:.4f}s, "
+                    f"成功率: {del_success_rate*100:.1f}%")
 
 
-async def run_error_patterns_test(client: SessionClient, iterations: int = 20):
+async def run_error_patterns_test(client: SessionClient, results: DiagResults, iterations: int = 20):
     """测试不同操作的错误模式"""
     logger.info("开始错误模式测试")
 
@@ -170,7 +236,7 @@ async def run_error_patterns_test(client: SessionClient, iterations: int = 20):
             invalid_session_errors.append(error)
 
     # 测试连续多次删除同一会话
-    if results["success_rate"]["set"] > 0:
+    if results.set_rate > 0:
         # 创建一个会话
         _, result, success, _ = await measure_operation(client, "set", 99999)
         if success:
@@ -238,35 +304,41 @@ async def run_concurrency_test(client: SessionClient, concurrency: int = 20):
     start_time = time.time()
     get_tasks = []
 
-    for i in range(concurrency):
-        # 随机选择一个会话ID
-        session_id = session_ids[i % len(session_ids)]
-        get_tasks.append(measure_operation(client, "get", session_id))
+    async with asyncio.TaskGroup() as tg:
+        for i in range(concurrency):
+            # 随机选择一个会话ID
+            session_id = session_ids[i % len(session_ids)]
+            get_tasks.append(tg.create_task(
+                measure_operation(client, "get", session_id)))
 
-    get_results = await asyncio.gather(*get_tasks)
-    get_latencies = [r[0] for r in get_results]
-    get_success_count = sum(1 for r in get_results if r[2])
+    get_results = [t.result() for t in get_tasks]
+    get_latencies = np.fromiter((r[0] for r in get_results), dtype=np.float64,
+                                count=len(get_results))
+    get_success_count = sum(r[2] for r in get_results)
 
     logger.info(f"并发获取会话: 成功率: {get_success_count / concurrency * 100:.1f}%, "
-                f"平均延迟: {statistics.mean(get_latencies):.4f}s, "
-                f"最大延迟: {max(get_latencies):.4f}s")
+                f"平均延迟: {get_latencies.mean():.4f}s, "
+                f"最大延迟: {get_latencies.max():.4f}s")
 
     # 并发删除会话
     del_tasks = []
 
-    for i in range(min(concurrency, len(session_ids))):
-        del_tasks.append(measure_operation(client, "del", session_ids[i]))
+    async with asyncio.TaskGroup() as tg:
+        for i in range(min(concurrency, len(session_ids))):
+            del_tasks.append(tg.create_task(
+                measure_operation(client, "del", session_ids[i])))
 
-    del_results = await asyncio.gather(*del_tasks)
-    del_latencies = [r[0] for r in del_results]
-    del_success_count = sum(1 for r in del_results if r[2])
+    del_results = [t.result() for t in del_tasks]
+    del_latencies = np.fromiter((r[0] for r in del_results), dtype=np.float64,
+                                count=len(del_results))
+    del_success_count = sum(r[2] for r in del_results)
 
     logger.info(f"并发删除会话: 成功率: {del_success_count / len(del_tasks) * 100:.1f}%, "
-                f"平均延迟: {statistics.mean(del_latencies):.4f}s, "
-                f"最大延迟: {max(del_latencies):.4f}s")
+                f"平均延迟: {del_latencies.mean():.4f}s, "
+                f"最大延迟: {del_latencies.max():.4f}s")
 
 
-async def analyze_results():
+async def analyze_results(results: DiagResults):
     """分析测试结果，判断问题来源"""
     logger.info("分析测试结果...")
 
@@ -274,30 +346,32 @@ async def analyze_results():
     high_latency = False
     latency_variance = False
 
-    for op, latencies in results["latency"].items():
-        if latencies:
-            avg_latency = statistics.mean(latencies)
-            if avg_latency > 0.5:  # 如果平均延迟超过500毫秒
+    for op in OPERATIONS:
+        latencies = getattr(results, f"{op}_lat")
+        if latencies.size:
+            avg_latency, stdev, is_high, is_variant = _analyze(latencies)
+            if is_high:  # 如果平均延迟超过500毫秒
                 high_latency = True
                 logger.warning(f"操作 {op} 的平均延迟较高: {avg_latency:.4f}s")
 
-            if len(latencies) > 5:
-                stdev = statistics.stdev(latencies)
-                if stdev > avg_latency * 0.5:  # 如果标准差大于平均值的50%
+            if latencies.size > 5:
+                if is_variant:  # 如果标准差大于平均值的50%
                     latency_variance = True
                     logger.warning(
                         f"操作 {op} 的延迟波动较大: 平均值 {avg_latency:.4f}s, 标准差 {stdev:.4f}s")
 
     # 成功率分析
     low_success_rate = False
-    for op, rate in results["success_rate"].items():
+    for op in OPERATIONS:
+        rate = getattr(results, f"{op}_rate")
         if rate < 0.95:  # 如果成功率低于95%
             low_success_rate = True
             logger.warning(f"操作 {op} 的成功率较低: {rate*100:.1f}%")
 
     # 错误模式分析
     error_pattern_exists = False
-    for op, errors in results["errors"].items():
+    for op in OPERATIONS:
+        errors = getattr(results, f"{op}_err")
         if errors:
             error_pattern_exists = True
             logger.warning(f"操作 {op} 发生了 {len(errors)} 个错误")
@@ -319,52 +393,64 @@ async def analyze_results():
     else:
         verdict = "无法确定: 需要更多数据来判断问题源头"
 
-    results["verdict"] = verdict
+    results.verdict = verdict
     logger.info(f"诊断结论: {verdict}")
 
-    # 将结果保存到JSON文件
-    with open(f"diagnostics_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json", "w") as f:
-        json.dump(results, f, indent=2)
+    save_results(results)
+
+
+def save_results(results: DiagResults):
+    """将结果保存到JSON文件"""
+    with open(f"diagnostics_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json", "wb") as f:
+        f.write(orjson.dumps(
+            results.to_dict(), option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
 
     logger.info("诊断结果已保存到JSON文件")
 
 
-async def run_diagnostics(host: str = '127.0.0.1', port: int = 50054):
+async def run_diagnostics(host: str = '127.0.0.1', port: int = 50054) -> DiagResults:
     """运行全面诊断测试"""
     logger.info(f"开始服务诊断 - 连接到 {host}:{port}")
-    results["test_conditions"] = {
+    results = DiagResults()
+    results.test_conditions = {
         "host": host,
         "port": port,
         "timestamp": datetime.now().isoformat(),
     }
 
-    client = SessionClient(host, port)
-
     try:
-        await client.connect()
-        logger.info("连接到服务成功")
+        async with SessionClient(host, port) as client:
+            logger.info("连接到服务成功")
 
-        # 运行延迟测试
-        await run_latency_test(client)
+            # 运行延迟测试
+            await run_latency_test(client, results)
 
-        # 运行错误模式测试
-        await run_error_patterns_test(client)
+            # 运行错误模式测试
+            await run_error_patterns_test(client, results)
 
-        # 运行并发测试
-        await run_concurrency_test(client)
+            # 运行并发测试
+            await run_concurrency_test(client)
 
-        # 分析结果
-        await analyze_results()
+            # 分析结果
+            await analyze_results(results)
 
     except Exception as e:
         logger.error(f"诊断过程中发生错误: {e}")
-        results["verdict"] = f"测试失败: {str(e)}"
+        results.verdict = f"测试失败: {str(e)}"
+        save_results(results)
     finally:
-        await client.disconnect()
         logger.info("诊断完成")
 
+    return results
+
 
 if __name__ == "__main__":
+    try:
+        import uvloop
+        run = uvloop.run
+    except ImportError:  # 未安装 uvloop 时使用默认事件循环
+        run = asyncio.run
+
     parser = argparse.ArgumentParser(description="StealthIM Session 服务诊断工具")
     parser.add_argument("--host", default="127.0.0.1",
                         help="服务主机地址 (默认: 127.0.0.1)")
@@ -373,4 +459,4 @@ if __name__ == "__main__":
 
     args = parser.parse_args()
 
-    asyncio.run(run_diagnostics(args.host, args.port))
+    run(run_diagnostics(args.host, args.port))
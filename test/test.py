@@ -12,8 +12,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# pytest-asyncio 配置
-pytestmark = pytest.mark.asyncio
+# pytest-asyncio 配置，所有测试共用同一个事件循环以复用客户端连接
+pytestmark = pytest.mark.asyncio(loop_scope="session")
 
 # 测试数据 - 根据实际行为调整预期值
 SET_SESSION_CASES = [
@@ -97,23 +97,19 @@ SESSION_LIFECYCLE_SCENARIOS = [
 ]
 
 
-@pytest_asyncio.fixture
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
 async def client():
-    """创建测试客户端fixture"""
-    client = SessionClient()
-    await client.connect()
-    await asyncio.sleep(1)  # 等待连接建立
-    yield client
-    await client.disconnect()
+    """创建测试客户端fixture，整个测试会话共用一个连接"""
+    async with SessionClient() as client:
+        await asyncio.sleep(1)  # 等待连接建立
+        yield client
 
 
-@pytest.mark.asyncio
 async def test_ping(client: SessionClient):
     """测试ping功能"""
     assert await client.ping() is True
 
 
-@pytest.mark.asyncio
 @pytest.mark.parametrize("uid, expected_code", SET_SESSION_CASES)
 async def test_set_session(client: SessionClient, uid: int, expected_code: int):
     """测试设置会话，使用参数化测试"""
@@ -125,7 +121,6 @@ async def test_set_session(client: SessionClient, uid: int, expected_code: int):
         assert result[1], "成功设置会话应返回有效会话ID"
 
 
-@pytest.mark.asyncio
 @pytest.mark.parametrize("session_id, expected_code, expected_uid", GET_SESSION_CASES)
 async def test_get_session(client: SessionClient, session_id: str, expected_code: int, expected_uid: int):
     """测试获取会话，使用参数化测试"""
@@ -142,7 +137,6 @@ async def test_get_session(client: SessionClient, session_id: str, expected_code
         assert result[1] == expected_uid, f"获取会话应返回UID {expected_uid}，但得到 {result[1]}"
 
 
-@pytest.mark.asyncio
 @pytest.mark.parametrize("session_id, expected_code", DELETE_SESSION_CASES)
 async def test_delete_session(client: SessionClient, session_id: str, expected_code: int):
     """测试删除会话，使用参数化测试"""
@@ -156,7 +150,6 @@ async def test_delete_session(client: SessionClient, session_id: str, expected_c
     assert result == expected_code, f"删除会话应返回状态码 {expected_code}，但得到 {result}"
 
 
-@pytest.mark.asyncio
 @pytest.mark.parametrize("scenario_name, uid, operations", SESSION_LIFECYCLE_SCENARIOS)
 async def test_session_lifecycle_scenarios(client: SessionClient, scenario_name: str, uid: int, operations: List):
     """测试会话生命周期的多轮场景"""
@@ -241,7 +234,6 @@ async def test_session_lifecycle_scenarios(client: SessionClient, scenario_name:
             assert False, f"未知的操作类型: {operation}"
 
 
-@pytest.mark.asyncio
 async def test_reload_service(client: SessionClient):
     """测试服务重载功能"""
     assert await client.reload_service() == 0, "重载服务应成功"
@@ -1,10 +1,12 @@
 import pytest
 import logging
 import asyncio
+import itertools
 import time
 import random
+import sys
 import string
-from typing import List, Dict, Optional
+from typing import List
 import pytest_asyncio
 import concurrent.futures
 from test_py import SessionClient
@@ -16,19 +18,20 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# pytest-asyncio 配置
-pytestmark = pytest.mark.asyncio
+# pytest-asyncio 配置，本模块的测试共用同一个事件循环以复用客户端连接
+pytestmark = pytest.mark.asyncio(loop_scope="module")
 
 # 压力测试配置
 CONCURRENT_CLIENTS = 10       # 并发客户端数量
 SESSIONS_PER_CLIENT = 100     # 每个客户端创建的会话数
 OPERATION_ROUNDS = 3          # 操作轮次
 DELETE_PROBABILITY = 0.3      # 删除会话的概率
+CREATE_CONCURRENCY = 32       # 每个客户端同时进行的创建请求数
 
 
-@pytest_asyncio.fixture
+@pytest_asyncio.fixture(scope="module", loop_scope="module")
 async def stress_clients():
-    """创建多个测试客户端的fixture"""
+    """创建多个测试客户端的fixture，本模块内的测试共用"""
     clients = []
     for i in range(CONCURRENT_CLIENTS):
         client = SessionClient()
@@ -43,99 +46,92 @@ async def stress_clients():
         await client.disconnect()
 
 
-async def create_session(client: SessionClient, uid: int) -> Optional[str]:
-    """创建会话并返回会话ID"""
-    try:
-        result = await client.set_session(uid)
-        if result[0] == 0 and result[1]:
-            return result[1]
-        return None
-    except Exception as e:
-        logger.error(f"创建会话失败: {e}")
-        return None
-
-
-async def get_session(client: SessionClient, session_id: str) -> bool:
-    """获取会话信息"""
-    try:
-        result = await client.get_session(session_id)
-        return result[0] == 0
-    except Exception as e:
-        logger.error(f"获取会话失败: {e}")
-        return False
-
-
-async def delete_session(client: SessionClient, session_id: str) -> bool:
-    """删除会话"""
-    try:
-        result = await client.delete_session(session_id)
-        return result == 0
-    except Exception as e:
-        logger.error(f"删除会话失败: {e}")
-        return False
-
-
 async def run_client_workload(client_id: int, client: SessionClient):
     """为单个客户端运行工作负载"""
     logger.info(f"客户端 {client_id} 开始工作负载")
-    sessions: Dict[str, int] = {}  # 会话ID到UID的映射
-
-    # 创建会话阶段
-    for i in range(SESSIONS_PER_CLIENT):
-        uid = random.randint(1, 1000000)
-        session_id = await create_session(client, uid)
-        if session_id:
-            sessions[session_id] = uid
-            if i % 20 == 0:  # 每20个会话记录一次日志
-                logger.info(
-                    f"客户端 {client_id} 已创建 {i+1}/{SESSIONS_PER_CLIENT} 个会话")
-
-    logger.info(f"客户端 {client_id} 完成会话创建，共 {len(sessions)} 个会话")
-
-    # 随机访问和删除会话
-    active_sessions = list(sessions.keys())
+    session_ids: List[str] = []  # 会话ID
+
+    # 创建会话阶段，限制并发以便在同一连接上复用多个流
+    sem = asyncio.Semaphore(CREATE_CONCURRENCY)
+    created = 0
+    # 一次性生成全部UID，避免在每次请求前调用 randint
+    planned_uids = random.choices(range(1, 1000001), k=SESSIONS_PER_CLIENT)
+
+    async def _create_one(uid: int):
+        nonlocal created
+        async with sem:
+            code, session_id = await client.set_session(uid)
+        if code != 0 or not session_id:
+            return None
+        created += 1
+        if created % 20 == 0:  # 每20个会话记录一次日志
+            logger.info("客户端 %s 已创建 %s/%s 个会话",
+                        client_id, created, SESSIONS_PER_CLIENT)
+        return session_id
+
+    created_results = await asyncio.gather(
+        *(_create_one(uid) for uid in planned_uids), return_exceptions=True)
+    for result in created_results:
+        if isinstance(result, str) and result:
+            session_ids.append(result)
+
+    logger.info(f"客户端 {client_id} 完成会话创建，共 {len(session_ids)} 个会话")
+
+    # 随机访问和删除会话，active 的前 n 个元素为仍存活的会话
+    active = list(session_ids)
+    n = len(active)
     for round in range(OPERATION_ROUNDS):
-        if not active_sessions:
+        if n == 0:
             break
 
         logger.info(f"客户端 {client_id} 开始第 {round+1}/{OPERATION_ROUNDS} 轮操作")
         operations = []
+        to_delete = []
 
-        # 随机选择会话进行操作
-        sample_size = min(len(active_sessions), max(
-            10, len(active_sessions) // 2))
-        selected_sessions = random.sample(active_sessions, sample_size)
+        # 部分 Fisher-Yates 洗牌，把随机选中的会话原地换到前 sample_size 位
+        sample_size = min(n, max(10, n // 2))
+        for j in range(sample_size):
+            idx = random.randrange(j, n)
+            active[j], active[idx] = active[idx], active[j]
 
-        for session_id in selected_sessions:
+        # 倒序处理选中的会话，删除时与最后一个存活会话交换，保证 O(1)
+        for j in range(sample_size - 1, -1, -1):
+            session_id = active[j]
             # 有一定概率删除会话
             if random.random() < DELETE_PROBABILITY:
-                operations.append(delete_session(client, session_id))
-                active_sessions.remove(session_id)
+                to_delete.append(session_id)
+                n -= 1
+                active[j], active[n] = active[n], active[j]
             else:
                 # 否则获取会话
-                operations.append(get_session(client, session_id))
-
-        # 等待所有操作完成
-        results = await asyncio.gather(*operations)
-        success = results.count(True)
+                operations.append(client.get_session(session_id))
+
+        # 等待所有操作完成，本轮要删除的会话一次性批量删除
+        results, del_codes = await asyncio.gather(
+            asyncio.gather(*operations, return_exceptions=True),
+            client.delete_sessions(to_delete))
+        success = sum(1 for r in results if isinstance(r, tuple) and r[0] == 0) \
+            + del_codes.count(0)
         logger.info(
-            f"客户端 {client_id} 第 {round+1} 轮: {success}/{len(operations)} 操作成功")
+            f"客户端 {client_id} 第 {round+1} 轮: {success}/{len(operations) + len(to_delete)} 操作成功")
 
-    return len(sessions), len(active_sessions)
+    return len(session_ids), n
 
 
-@pytest.mark.asyncio
 async def test_memory_stress(stress_clients):
     """测试服务在高内存压力下的性能"""
     start_time = time.time()
 
-    # 启动所有客户端的工作负载
-    tasks = []
-    for i, client in enumerate(stress_clients):
-        tasks.append(run_client_workload(i, client))
+    # 启动所有客户端的工作负载，任一工作负载异常时立即取消其余的并使测试失败
+    workloads = [run_client_workload(i, client)
+                 for i, client in enumerate(stress_clients)]
 
-    # 等待所有工作负载完成
-    results = await asyncio.gather(*tasks)
+    if sys.version_info >= (3, 11):
+        async with asyncio.TaskGroup() as tg:
+            tasks = [tg.create_task(workload) for workload in workloads]
+        results = [task.result() for task in tasks]
+    else:
+        results = await asyncio.gather(*workloads)
 
     # 统计结果
     total_sessions = sum(created for created, _ in results)
@@ -153,47 +149,35 @@ async def test_memory_stress(stress_clients):
     assert duration > 0, "测试时间应该为正值"
 
 
-@pytest.mark.asyncio
 async def test_concurrent_same_uid(stress_clients):
     """测试多个客户端并发访问同一个UID的会话"""
     # 使用相同的UID
     shared_uid = 12345
-    session_ids = []
 
     # 所有客户端并发地为同一个UID创建会话
-    create_tasks = []
-    for client in stress_clients:
-        create_tasks.append(create_session(client, shared_uid))
-
-    session_ids = await asyncio.gather(*create_tasks)
-    valid_sessions = [s for s in session_ids if s]
+    create_tasks = [client.set_session(shared_uid) for client in stress_clients]
+    create_results = await asyncio.gather(*create_tasks, return_exceptions=True)
+    valid_sessions = [r[1] for r in create_results
+                      if isinstance(r, tuple) and r[0] == 0 and r[1]]
 
     logger.info(f"为共享UID {shared_uid} 创建了 {len(valid_sessions)} 个会话")
 
-    # 所有客户端并发获取所有会话
-    total_get_operations = 0
-    success_get_operations = 0
-
-    for session_id in valid_sessions:
-        get_tasks = []
-        for client in stress_clients:
-            get_tasks.append(get_session(client, session_id))
-
-        results = await asyncio.gather(*get_tasks)
-        total_get_operations += len(results)
-        success_get_operations += results.count(True)
-
-    # 所有客户端并发删除会话
-    total_delete_operations = 0
-    success_delete_operations = 0
-
-    for session_id in valid_sessions:
-        # 随机选择一个客户端删除会话
-        client = random.choice(stress_clients)
-        result = await delete_session(client, session_id)
-        total_delete_operations += 1
-        if result:
-            success_delete_operations += 1
+    # 所有客户端并发获取所有会话，合并为一次 gather
+    get_tasks = [client.get_session(session_id)
+                 for session_id in valid_sessions
+                 for client in stress_clients]
+    results = await asyncio.gather(*get_tasks, return_exceptions=True)
+    total_get_operations = len(results)
+    success_get_operations = sum(
+        1 for r in results if isinstance(r, tuple) and r[0] == 0)
+
+    # 按打乱后的客户端顺序轮流分配会话，所有删除合并为一次 gather
+    client_iter = itertools.cycle(random.sample(stress_clients, len(stress_clients)))
+    del_tasks = [next(client_iter).delete_session(session_id)
+                 for session_id in valid_sessions]
+    del_results = await asyncio.gather(*del_tasks, return_exceptions=True)
+    total_delete_operations = len(del_results)
+    success_delete_operations = del_results.count(0)
 
     logger.info(f"并发同UID测试完成:")
     logger.info(f"- 有效会话数: {len(valid_sessions)}")
@@ -206,43 +190,33 @@ async def test_concurrent_same_uid(stress_clients):
     assert success_get_operations > 0, "应该成功获取至少一些会话"
 
 
-@pytest.mark.asyncio
-async def test_rapid_create_delete_cycle():
+async def test_rapid_create_delete_cycle(stress_clients):
     """测试快速创建和删除会话的循环"""
-    client = SessionClient()
-    await client.connect()
-
-    try:
-        cycle_count = 200
-        success_count = 0
-
-        start_time = time.time()
-
-        for i in range(cycle_count):
-            uid = random.randint(1, 1000000)
-            result = await client.set_session(uid)
+    client = stress_clients[0]
 
-            if result[0] == 0 and result[1]:
-                session_id = result[1]
-                delete_result = await client.delete_session(session_id)
+    cycle_count = 200
 
-                if delete_result == 0:
-                    success_count += 1
+    start_time = time.time()
+    uids = random.choices(range(1, 1000001), k=cycle_count)
 
-            if i % 50 == 0:
-                logger.info(f"已完成 {i}/{cycle_count} 个创建/删除循环")
+    # 先并发创建全部会话，再批量删除，避免每个循环各自等待两次往返
+    create_results = await asyncio.gather(
+        *(client.set_session(uid) for uid in uids), return_exceptions=True)
+    session_ids = [r[1] for r in create_results
+                   if isinstance(r, tuple) and r[0] == 0 and r[1]]
+    logger.info(f"已创建 {len(session_ids)}/{cycle_count} 个会话，开始删除")
 
-        duration = time.time() - start_time
+    del_codes = await client.delete_sessions(session_ids)
+    success_count = del_codes.count(0)
 
-        logger.info(f"快速创建/删除循环测试完成:")
-        logger.info(f"- 成功循环: {success_count}/{cycle_count}")
-        logger.info(f"- 总执行时间: {duration:.2f} 秒")
-        logger.info(f"- 每秒平均循环: {cycle_count/duration:.2f}")
+    duration = time.time() - start_time
 
-        assert success_count > 0, "应该成功执行至少一些创建/删除循环"
+    logger.info(f"快速创建/删除循环测试完成:")
+    logger.info(f"- 成功循环: {success_count}/{cycle_count}")
+    logger.info(f"- 总执行时间: {duration:.2f} 秒")
+    logger.info(f"- 每秒平均循环: {cycle_count/duration:.2f}")
 
-    finally:
-        await client.disconnect()
+    assert success_count > 0, "应该成功执行至少一些创建/删除循环"
 
 
 if __name__ == "__main__":
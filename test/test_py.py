@@ -1,13 +1,13 @@
 import asyncio
+import itertools
 import logging
 from typing import Tuple, Optional, Any, Dict, List
 
-import grpclib.client
-from grpclib.exceptions import GRPCError
+import grpc
 
 # 导入生成的protobuf模块
 import session_pb2
-import session_grpc
+import session_pb2_grpc
 
 # 配置日志
 logging.basicConfig(
@@ -16,37 +16,76 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# gRPC 通道参数：
+# keepalive 间隔不低于 Go 服务端默认允许的 5 分钟，否则会被服务端以 too_many_pings 断开；
+# 使用独立的子通道池，让连接池中的每个通道各自建立 TCP 连接
+_CHANNEL_OPTIONS = [
+    ("grpc.keepalive_time_ms", 300000),
+    ("grpc.keepalive_timeout_ms", 10000),
+    ("grpc.http2.max_pings_without_data", 0),
+    ("grpc.use_local_subchannel_pool", 1),
+]
+
+# 无字段的请求可安全复用；带字段的请求在 grpc.aio 中于调用任务内才序列化，
+# 并发时共用同一实例会相互覆盖，因此仍按次创建
+_PING_REQUEST = session_pb2.PingRequest()
+_RELOAD_REQUEST = session_pb2.ReloadRequest()
+
 
 class SessionClient:
     """StealthIMSession服务的测试客户端"""
 
-    def __init__(self, host: str = "localhost", port: int = 50054):
+    def __init__(self, host: str = "localhost", port: int = 50054, pool_size: int = 4):
         """初始化会话客户端
 
         Args:
             host: 服务主机名
             port: 服务端口
+            pool_size: 连接池中的通道数量
         """
         self.host = host
         self.port = port
-        self.channel = None
+        self._pool_size = pool_size
+        self._channels = []
+        self._stubs = []
+        self._rr = itertools.count()
         self.session_id = None  # 存储当前会话ID
 
     async def connect(self) -> None:
-        """连接到服务"""
+        """连接到服务，建立的通道池在断开前一直复用"""
+        if self._channels:
+            return
         try:
-            self.channel = grpclib.client.Channel(self.host, self.port)
-            logger.info(f"已连接到 {self.host}:{self.port}")
+            target = f"{self.host}:{self.port}"
+            self._channels = [grpc.aio.insecure_channel(target, options=_CHANNEL_OPTIONS)
+                              for _ in range(self._pool_size)]
+            self._stubs = [session_pb2_grpc.StealthIMSessionStub(channel)
+                           for channel in self._channels]
+            logger.info("已连接到 %s:%s", self.host, self.port)
         except Exception as e:
-            logger.error(f"连接失败: {e}")
+            logger.error("连接失败: %s", e)
             raise
 
     async def disconnect(self) -> None:
         """断开与服务的连接"""
-        if self.channel:
-            self.channel.close()
+        if self._channels:
+            for channel in self._channels:
+                await channel.close()
+            self._channels = []
+            self._stubs = []
             logger.info("已断开连接")
 
+    def _next_stub(self) -> session_pb2_grpc.StealthIMSessionStub:
+        """轮询选取连接池中的下一个stub"""
+        return self._stubs[next(self._rr) % self._pool_size]
+
+    async def __aenter__(self) -> "SessionClient":
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.disconnect()
+
     async def ping(self) -> bool:
         """测试服务可用性
 
@@ -54,14 +93,11 @@ class SessionClient:
             bool: 服务是否可用
         """
         try:
-            async with self.channel as channel:
-                request = session_pb2.PingRequest()
-                stub = session_grpc.StealthIMSessionStub(channel)
-                response = await stub.Ping(request)
-                logger.debug("Ping成功")
-                return True
-        except Exception as e:
-            logger.error(f"Ping失败: {e}")
+            await self._next_stub().Ping(_PING_REQUEST)
+            logger.debug("Ping成功")
+            return True
+        except grpc.aio.AioRpcError as e:
+            logger.error("Ping失败: %s", e)
             return False
 
     async def set_session(self, uid: int) -> Tuple[int, str]:
@@ -74,29 +110,23 @@ class SessionClient:
             Tuple[int, str]: (状态码, 会话ID)
         """
         try:
-
-            async with self.channel as channel:
-                stub = session_grpc.StealthIMSessionStub(channel)
-                request = session_pb2.SetRequest(uid=uid)
-                response = await stub.Set(request)
+            request = session_pb2.SetRequest(uid=uid)
+            response = await self._next_stub().Set(request)
 
             code = response.result.code
             session = response.session
 
             if code == 0:
                 self.session_id = session  # 存储会话ID
-                logger.info(f"设置会话成功: UID={uid}, 会话ID={session}")
+                logger.info("设置会话成功: UID=%s, 会话ID=%s", uid, session)
             else:
                 logger.warning(
-                    f"设置会话失败: UID={uid}, 状态码={code}, 信息={response.result.msg}")
+                    "设置会话失败: UID=%s, 状态码=%s, 信息=%s", uid, code, response.result.msg)
 
             return (code, session)
-        except GRPCError as e:
-            logger.error(f"设置会话时发生gRPC错误: {e}")
-            return (e.status, "")
-        except Exception as e:
-            logger.error(f"设置会话时发生异常: {e}")
-            return (-1, "")
+        except grpc.aio.AioRpcError as e:
+            logger.error("设置会话时发生gRPC错误: %s", e)
+            return (e.code().value[0], "")
 
     async def get_session(self, session_id: str) -> Tuple[int, int]:
         """获取会话
@@ -108,27 +138,22 @@ class SessionClient:
             Tuple[int, int]: (状态码, 用户ID)
         """
         try:
-            async with self.channel as channel:
-                stub = session_grpc.StealthIMSessionStub(channel)
-                request = session_pb2.GetRequest(session=session_id)
-                response = await stub.Get(request)
+            request = session_pb2.GetRequest(session=session_id)
+            response = await self._next_stub().Get(request)
 
             code = response.result.code
             uid = response.uid
 
             if code == 0:
-                logger.info(f"获取会话成功: 会话ID={session_id}, UID={uid}")
+                logger.info("获取会话成功: 会话ID=%s, UID=%s", session_id, uid)
             else:
                 logger.warning(
-                    f"获取会话失败: 会话ID={session_id}, 状态码={code}, 信息={response.result.msg}")
+                    "获取会话失败: 会话ID=%s, 状态码=%s, 信息=%s", session_id, code, response.result.msg)
 
             return (code, uid)
-        except GRPCError as e:
-            logger.error(f"获取会话时发生gRPC错误: {e}")
-            return (e.status, 0)
-        except Exception as e:
-            logger.error(f"获取会话时发生异常: {e}")
-            return (-1, 0)
+        except grpc.aio.AioRpcError as e:
+            logger.error("获取会话时发生gRPC错误: %s", e)
+            return (e.code().value[0], 0)
 
     async def delete_session(self, session_id: str) -> int:
         """删除会话
@@ -140,29 +165,39 @@ class SessionClient:
             int: 状态码
         """
         try:
-            async with self.channel as channel:
-                stub = session_grpc.StealthIMSessionStub(channel)
-                request = session_pb2.DelRequest(session=session_id)
-                response = await stub.Del(request)
+            request = session_pb2.DelRequest(session=session_id)
+            response = await self._next_stub().Del(request)
 
             code = response.result.code
 
             if code == 0:
-                logger.info(f"删除会话成功: 会话ID={session_id}")
+                logger.info("删除会话成功: 会话ID=%s", session_id)
                 # 如果删除的是当前会话，清除存储的会话ID
                 if session_id == self.session_id:
                     self.session_id = None
             else:
                 logger.warning(
-                    f"删除会话失败: 会话ID={session_id}, 状态码={code}, 信息={response.result.msg}")
+                    "删除会话失败: 会话ID=%s, 状态码=%s, 信息=%s", session_id, code, response.result.msg)
 
             return code
-        except GRPCError as e:
-            logger.error(f"删除会话时发生gRPC错误: {e}")
-            return e.status
-        except Exception as e:
-            logger.error(f"删除会话时发生异常: {e}")
-            return -1
+        except grpc.aio.AioRpcError as e:
+            logger.error("删除会话时发生gRPC错误: %s", e)
+            return e.code().value[0]
+
+    async def delete_sessions(self, session_ids: List[str]) -> List[Any]:
+        """批量删除会话
+
+        服务端暂无批量删除接口，这里将所有删除请求同时发出，分散到连接池的各个通道上
+
+        Args:
+            session_ids: 会话ID列表
+
+        Returns:
+            List[Any]: 与 session_ids 一一对应的结果，成功时为状态码，失败时为异常对象，由调用方统计
+        """
+        return await asyncio.gather(
+            *(self.delete_session(session_id) for session_id in session_ids),
+            return_exceptions=True)
 
     async def reload_service(self) -> int:
         """重新加载服务配置
@@ -171,10 +206,7 @@ class SessionClient:
             int: 状态码
         """
         try:
-            async with self.channel as channel:
-                stub = session_grpc.StealthIMSessionStub(channel)
-                request = session_pb2.ReloadRequest()
-                response = await stub.Reload(request)
+            response = await self._next_stub().Reload(_RELOAD_REQUEST)
 
             code = response.result.code
 
@@ -182,15 +214,12 @@ class SessionClient:
                 logger.info("重新加载服务配置成功")
             else:
                 logger.warning(
-                    f"重新加载服务配置失败: 状态码={code}, 信息={response.result.msg}")
+                    "重新加载服务配置失败: 状态码=%s, 信息=%s", code, response.result.msg)
 
             return code
-        except GRPCError as e:
-            logger.error(f"重新加载服务配置时发生gRPC错误: {e}")
-            return e.status
-        except Exception as e:
-            logger.error(f"重新加载服务配置时发生异常: {e}")
-            return -1
+        except grpc.aio.AioRpcError as e:
+            logger.error("重新加载服务配置时发生gRPC错误: %s", e)
+            return e.code().value[0]
 
     async def get_current_session(self) -> Optional[str]:
         """获取当前会话ID
@@ -252,4 +281,10 @@ async def run_quick_test(host: str = "localhost", port: int = 50054) -> None:
 
 # 命令行直接运行时执行快速测试
 if __name__ == "__main__":
-    asyncio.run(run_quick_test())
+    try:
+        import uvloop
+        run = uvloop.run
+    except ImportError:  # 未安装 uvloop 时使用默认事件循环
+        run = asyncio.run
+
+    run(run_quick_test())